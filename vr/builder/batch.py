@@ -0,0 +1,253 @@
+"""
+Build many apps in one go.  build_many(paths, outfolder, concurrency) is the
+main API.
+
+Rebuilding lots of apps at once (say after bumping a base image or a
+buildpack) would otherwise update the same buildpacks and unpack the same
+images once per app.  Here each unique buildpack is updated once, and a
+snapshot of it taken for the builds to copy from, and each unique image is
+downloaded and unpacked once, before the builds themselves run on a pool of
+processes.  Builds of the same app repo share its checkout and cache locks,
+so they run one after another.
+
+Each build writes its usual outputs (build.tar.gz, build_result.yaml and
+logs) to a folder of its own inside outfolder, along with a build.log of
+everything it printed.  A summary.yaml with the result and timing of every
+build is written to outfolder.  A build file that can't be loaded is
+recorded there as failed, rather than stopping the batch.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import traceback
+import collections
+import multiprocessing
+
+from six.moves import urllib
+
+import yaml
+from more_itertools import unique_everseen
+
+from vr.common.utils import mkdir
+from vr.runners.image import ensure_image, IMAGES_ROOT
+from vr.builder.build import cmd_build
+from vr.builder.build_data import load_build_data, get_buildpack_urls
+from vr.builder.models import (update_buildpack, lock_or_wait,
+                               get_unique_repo_folder)
+from .py31compat import _defrag
+
+
+SUMMARY_NAME = 'summary.yaml'
+
+
+def find_build_files(paths):
+    """
+    Given paths to build.yaml files, or folders of them, return the paths of
+    all the build files, in order.  Summaries written by an earlier batch
+    into a folder aren't build files, and are skipped.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            found = (
+                glob.glob(os.path.join(path, '*.yaml'))
+                + glob.glob(os.path.join(path, '*.yml'))
+            )
+            for filename in sorted(found):
+                if os.path.basename(filename) != SUMMARY_NAME:
+                    yield filename
+        else:
+            yield path
+
+
+def prepare_buildpacks(builds, folder):
+    """
+    Update each buildpack used by builds once, and snapshot it into folder.
+
+    Return a dict mapping buildpack url to its snapshot.  Urls for different
+    revisions of one buildpack share its checkout, but each gets a snapshot
+    of its own.  A buildpack that fails to update is left out, so the builds
+    using it update it (and report the failure) themselves.
+    """
+    urls = unique_everseen(
+        url
+        for build_data in builds
+        for url in get_buildpack_urls(build_data)
+    )
+    snapshots = {}
+    for url in urls:
+        defrag = _defrag(urllib.parse.urldefrag(url))
+        dest = os.path.join(folder, get_unique_repo_folder(url))
+        try:
+            with lock_or_wait(defrag.url):
+                bp = update_buildpack(url)
+                shutil.copytree(bp.folder, dest)
+        except Exception:
+            print("Failed to prepare buildpack", url)
+            traceback.print_exc()
+            continue
+        snapshots[url] = dest
+    return snapshots
+
+
+def prepare_images(builds):
+    """
+    Download and unpack each image used by builds once, where vrun setup
+    will find it already in place.  A failure is left for the builds using
+    that image to report.
+    """
+    images = unique_everseen(
+        (build_data.image_name, build_data.image_url, build_data.image_md5)
+        for build_data in builds
+        if build_data.image_url
+    )
+    for name, url, md5 in images:
+        image_folder = os.path.join(IMAGES_ROOT, name, 'contents')
+        if os.path.exists(image_folder):
+            continue
+        try:
+            mkdir(IMAGES_ROOT)
+            ensure_image(name, url, IMAGES_ROOT, md5, image_folder)
+        except Exception:
+            print("Failed to prepare image", name)
+            traceback.print_exc()
+
+
+def get_output_folder(build_data):
+    return '%s-%s' % (build_data.app_name, build_data.version)
+
+
+def get_repo_key(build_data):
+    """
+    Builds with the same key lock the same app checkout and cache, so must
+    not run at the same time.
+    """
+    return _defrag(urllib.parse.urldefrag(build_data.app_repo_url)).url
+
+
+def _failed(filename, error, **extra):
+    return dict(extra, file=filename, status='failed', error=error,
+                seconds=0)
+
+
+def _build_one(filename, outfolder, buildpacks):
+    """
+    Run one build in a pool process, and return a dict describing how it
+    went.  The process is used only for this batch job, so it's free to
+    change directory and redirect its output.
+    """
+    result = {
+        'file': filename,
+        'output': outfolder,
+    }
+    start = time.time()
+    mkdir(outfolder)
+    os.chdir(outfolder)
+    # Send output (including that of subprocesses) to the log, rather than
+    # interleaving it with the other builds.
+    with open('build.log', 'w') as log:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(log.fileno(), sys.stdout.fileno())
+        os.dup2(log.fileno(), sys.stderr.fileno())
+    try:
+        build_data = load_build_data(filename)
+        result.update(app_name=build_data.app_name,
+                      version=build_data.version)
+        cmd_build(build_data, buildpacks=buildpacks)
+        result.update(status='ok', build_md5=build_data.build_md5)
+    except Exception:
+        traceback.print_exc()
+        result.update(status='failed',
+                      error=traceback.format_exc().splitlines()[-1])
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def _build_group(jobs):
+    """
+    Run, one after another, a group of builds of the same app repo.
+    """
+    return [_build_one(*job) for job in jobs]
+
+
+def build_many(paths, outfolder, concurrency=1):
+    """
+    Build every build.yaml file found in paths, running up to concurrency
+    builds at a time, with outputs written under outfolder.
+
+    Return the summary, as written to outfolder/summary.yaml.
+    """
+    start = time.time()
+    filenames = [os.path.abspath(f) for f in find_build_files(paths)]
+    results = []
+    builds = []
+    groups = collections.OrderedDict()
+    outfolders = {}
+    for filename in filenames:
+        try:
+            build_data = load_build_data(filename)
+        except Exception:
+            error = traceback.format_exc().splitlines()[-1]
+            results.append(_failed(filename, error))
+            continue
+        folder = os.path.abspath(
+            os.path.join(outfolder, get_output_folder(build_data)))
+        if folder in outfolders:
+            error = 'Same app and version as %s' % outfolders[folder]
+            results.append(_failed(
+                filename, error, app_name=build_data.app_name,
+                version=build_data.version))
+            continue
+        outfolders[folder] = filename
+        builds.append(build_data)
+        groups.setdefault(get_repo_key(build_data), []).append(
+            (filename, folder))
+    mkdir(outfolder)
+
+    snapshot_folder = tempfile.mkdtemp()
+    try:
+        prepare_start = time.time()
+        buildpacks = prepare_buildpacks(builds, snapshot_folder)
+        prepare_images(builds)
+        prepare_seconds = round(time.time() - prepare_start, 3)
+
+        jobs = [
+            [(filename, folder, buildpacks) for filename, folder in group]
+            for group in groups.values()
+        ]
+        pool = multiprocessing.Pool(concurrency, maxtasksperchild=1)
+        try:
+            for group_results in pool.imap_unordered(_build_group, jobs):
+                for result in group_results:
+                    print(result['status'], result['file'],
+                          '(%ss)' % result['seconds'])
+                results.extend(group_results)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(snapshot_folder, ignore_errors=True)
+
+    results.sort(key=lambda result: filenames.index(result['file']))
+    summary = {
+        'concurrency': concurrency,
+        'prepare_seconds': prepare_seconds,
+        'seconds': round(time.time() - start, 3),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'failed': sum(1 for r in results if r['status'] != 'ok'),
+        'builds': results,
+    }
+    summary_path = os.path.join(outfolder, SUMMARY_NAME)
+    print("Writing", summary_path)
+    with open(summary_path, 'w') as f:
+        yaml.safe_dump(summary, f, default_flow_style=False)
+    return summary
@@ -3,9 +3,7 @@ from __future__ import print_function
 import os
 import shutil
 import subprocess
-import pkg_resources
 import tarfile
-import functools
 import contextlib
 import socket
 
@@ -13,19 +11,19 @@ from six.moves import urllib
 
 import yaml
 import path
-from more_itertools import always_iterable
 
-from vr.common.utils import tmpdir, mkdir, file_md5, chowntree
+from vr.common import repo
+from vr.common.utils import tmpdir, mkdir, chowntree
 from vr.builder.models import (BuildPack, update_buildpack, update_app,
-                               lock_or_wait, CACHE_HOME)
+                               lock_or_wait, get_cache_folder, CACHE_HOME)
 from vr.common.models import ProcData
+from vr.builder.build_data import get_buildpack_urls
 from vr.common.paths import get_container_path
 from vr.builder.slugignore import clean_slug_dir
 from .py31compat import _defrag
-from .hashes import hash_text
-
-
-pkg_filename = functools.partial(pkg_resources.resource_filename, 'vr.builder')
+from .digest import hash_text, file_digest
+from .py38compat import resources
+from .manifest import add_tree
 
 
 class NullSaver(object):
@@ -67,31 +65,39 @@ class OutputSaver(object):
         # slugignore
         clean_slug_dir(app_folder)
 
-        # tar up the result
+        # tar up the result, taking a manifest of the files on the way
         with tarfile.open('build.tar.gz', 'w:gz') as tar:
-            tar.add(app_folder, arcname='')
-        build_data.build_md5 = file_md5('build.tar.gz')
+            manifest = add_tree(tar, app_folder)
+        build_data.build_md5 = file_digest('build.tar.gz')
 
         tardest = os.path.join(self.outfolder, 'build.tar.gz')
         shutil.move('build.tar.gz', tardest)
 
+        manifest_path = os.path.join(self.outfolder, 'build.manifest')
+        print("Writing", manifest_path)
+        manifest.save(manifest_path)
+
         build_data_path = os.path.join(self.outfolder, 'build_result.yaml')
         print("Writing", build_data_path)
         with open(build_data_path, 'w') as f:
             f.write(build_data.as_yaml())
 
 
-def cmd_build(build_data, runner_cmd='run', make_tarball=True):
+def cmd_build(build_data, runner_cmd='run', make_tarball=True,
+              buildpacks=None):
     # runner_cmd may be 'run' or 'shell'.
+    # buildpacks may map buildpack urls to folders already holding the
+    # updated buildpack, to be copied instead of updating the shared
+    # checkout.
 
     saver = OutputSaver() if make_tarball else NullSaver()
 
     with tmpdir():
-        app_folder = _cmd_build(build_data, runner_cmd, saver)
+        app_folder = _cmd_build(build_data, runner_cmd, saver, buildpacks)
         saver.make_tarball(app_folder, build_data)
 
 
-def _cmd_build(build_data, runner_cmd, saver):
+def _cmd_build(build_data, runner_cmd, saver, buildpacks=None):
     print("Building on", socket.getfqdn())
     here = path.Path.getcwd()
     user = getattr(build_data, 'user', 'nobody')
@@ -118,9 +124,8 @@ def _cmd_build(build_data, runner_cmd, saver):
     ]
 
     buildpack_url = getattr(build_data, 'buildpack_url', None)
-    buildpack_urls = always_iterable(
-        buildpack_url or build_data.buildpack_urls)
-    buildpack_folders = pull_buildpacks(buildpack_urls)
+    buildpack_urls = get_buildpack_urls(build_data)
+    buildpack_folders = pull_buildpacks(buildpack_urls, buildpacks)
     buildpacks_env = ':'.join('/' + bp for bp in buildpack_folders)
     env_key = 'BUILDPACK_DIR' if buildpack_url else 'BUILDPACK_DIRS'
     env = {env_key: buildpacks_env}
@@ -132,7 +137,8 @@ def _cmd_build(build_data, runner_cmd, saver):
     # Some buildpacks (Node) like to rm -rf the whole cache folder they're
     # given.  They can't do that to a mountpoint, so we have to provide a
     # buildpack_cache folder nested inside the /cache mountpoint.
-    cachefolder = os.path.join(CACHE_HOME, app_basename)
+    cachefolder = get_cache_folder(
+        build_data.app_name, build_data.app_repo_url)
     if os.path.isdir(cachefolder):
         with lock_or_wait(cachefolder):
             mkdir('cache')
@@ -187,9 +193,10 @@ def _setup_container(run):
 @contextlib.contextmanager
 def _prepare_build(container_path, user, build_data, app_folder):
     # copy the builder.sh script into place.
-    script_src = pkg_filename('scripts/builder.sh')
+    script = resources.files('vr.builder') / 'scripts' / 'builder.sh'
     script_dst = path.Path(container_path) / 'builder.sh'
-    shutil.copy(script_src, script_dst)
+    with resources.as_file(script) as script_src:
+        shutil.copy(str(script_src), script_dst)
     # Make sure builder.sh is chmod a+x
     script_dst.chmod('a+x')
 
@@ -301,21 +308,29 @@ def pull_app(parent_folder, name, url, version, vcs_type):
     return dest
 
 
-def pull_buildpack(url):
+def pull_buildpack(url, source=None):
     """
     Update a buildpack in its shared location, then make a copy into the
     current directory, using an md5 of the url.
+
+    If source is given, it's a folder already holding the updated buildpack,
+    and the copy is made from there without touching the shared location.
     """
     defrag = _defrag(urllib.parse.urldefrag(url))
-    with lock_or_wait(defrag.url):
-        bp = update_buildpack(url)
-        dest = bp.basename + '-' + hash_text(defrag.url)
-        shutil.copytree(bp.folder, dest)
+    if source is None:
+        with lock_or_wait(defrag.url):
+            bp = update_buildpack(url)
+            dest = bp.basename + '-' + hash_text(defrag.url)
+            shutil.copytree(bp.folder, dest)
+    else:
+        dest = repo.basename(url) + '-' + hash_text(defrag.url)
+        shutil.copytree(source, dest)
     # Make the buildpack dir writable, per
     # https://bitbucket.org/yougov/velociraptor/issues/178
     path.Path(dest).chmod('a+wx')
     return dest
 
 
-def pull_buildpacks(urls):
-    return [pull_buildpack(u) for u in urls]
+def pull_buildpacks(urls, sources=None):
+    sources = sources or {}
+    return [pull_buildpack(u, sources.get(u)) for u in urls]
@@ -0,0 +1,52 @@
+import yaml
+from more_itertools import always_iterable
+
+from vr.common.models import ConfigData
+
+
+class BuildData(ConfigData):
+    _required = [
+        'app_name',
+        'app_repo_url',
+        'app_repo_type',
+        'version',
+    ]
+
+    _optional = [
+        'buildpack_url',
+        'buildpack_urls',
+        'buildpack_version',
+        'image_url',
+        'image_name',
+        'image_md5',
+        'build_md5',
+        'release_data',
+    ]
+
+    def __init__(self, dct):
+        super(BuildData, self).__init__(dct)
+
+        # must provide buildpack_urls or buildpack_url
+        if self.buildpack_urls is None and self.buildpack_url is None:
+            raise ValueError('Must provide either buildpack_url or '
+                             'buildpack_urls')
+
+    def __repr__(self):
+        return '<BuildData: %s-%s>' % (self.app_name, self.version)
+
+
+def load_build_data(filename):
+    """
+    Load a BuildData from the build.yaml file at filename.
+    """
+    with open(filename, 'rb') as f:
+        return BuildData(yaml.safe_load(f))
+
+
+def get_buildpack_urls(build_data):
+    """
+    Return the list of buildpack urls to build with, from whichever of
+    buildpack_url or buildpack_urls build_data provides.
+    """
+    buildpack_url = getattr(build_data, 'buildpack_url', None)
+    return list(always_iterable(buildpack_url or build_data.buildpack_urls))
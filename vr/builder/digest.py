@@ -0,0 +1,67 @@
+"""
+Digests of text and files.
+
+hash_text names checkout, cache and lock folders after repo URLs, so its
+default (an md5 hexdigest) must not change, or existing checkouts in
+REPO_HOME and PACKS_HOME would be orphaned.  Other algorithms (anything
+hashlib.new accepts, such as 'sha256' or 'blake2b') can be asked for by
+name.
+"""
+
+import hashlib
+import functools
+from multiprocessing.pool import ThreadPool
+
+
+DEFAULT_ALGORITHM = 'md5'
+
+# Read files in chunks of this many bytes.
+CHUNK_SIZE = 1024 * 1024
+
+
+@functools.lru_cache(maxsize=1024)
+def hash_text(text, algorithm=DEFAULT_ALGORITHM):
+    """
+    Return the hex digest of text, encoded as UTF-8.
+
+    The same few URLs are hashed over and over during a build, so results
+    are remembered.
+
+    >>> hash_text('https://example.com/app.git')
+    '2eca67135f338bc7b3b61afa3bb0d08b'
+    """
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.new(algorithm, text).hexdigest()
+
+
+def file_digest(filename, algorithm=DEFAULT_ALGORITHM, chunk_size=CHUNK_SIZE):
+    """
+    Return the hex digest of the file at filename, read a chunk at a time
+    so the whole file is never held in memory.
+    """
+    digest = hashlib.new(algorithm)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digests(filenames, algorithm=DEFAULT_ALGORITHM, workers=None):
+    """
+    Return a dict mapping each of filenames to its hex digest, hashing up
+    to workers files at a time (by default, one per CPU).
+
+    hashlib releases the GIL while it works on large chunks, so threads are
+    enough to keep several cores busy.
+    """
+    filenames = list(filenames)
+    if not filenames:
+        return {}
+    hash_file = functools.partial(file_digest, algorithm=algorithm)
+    pool = ThreadPool(workers)
+    try:
+        return dict(zip(filenames, pool.map(hash_file, filenames)))
+    finally:
+        pool.close()
+        pool.join()
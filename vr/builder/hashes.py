@@ -1,5 +1,7 @@
-import hashlib
+"""
+Kept for compatibility.  See vr.builder.digest.
+"""
 
+from .digest import hash_text
 
-def hash_text(text):
-    return hashlib.md5(text.encode('ascii')).hexdigest()
+__all__ = ['hash_text']
@@ -1,71 +1,142 @@
 #!/usr/bin/env python
 
+"""
+Command line entry point for building apps.
+
+Keep imports here cheap.  Anything heavy (vr.common, yaml, the build
+machinery) is imported by the command that needs it, so that invoking
+the CLI for quick commands or invalid input doesn't pay for it.
+"""
+
+from __future__ import print_function
+
 import argparse
 
-import yaml
 
-from vr.builder.build import cmd_build
-from vr.common.models import ConfigData
+def cmd_build(build_data, runner_cmd='run', make_tarball=True):
+    from vr.builder.build import cmd_build
+    cmd_build(build_data, runner_cmd=runner_cmd, make_tarball=make_tarball)
 
 
 def cmd_shell(build_data):
     cmd_build(build_data, runner_cmd='shell', make_tarball=False)
 
 
-commands = {
-    'build': cmd_build,
-    'shell': cmd_shell,
-}
+def cmd_plan(build_data):
+    """
+    Print, as JSON, the work that building build_data would do on this host.
+    """
+    import json
+    from vr.builder.plan import make_plan
+    print(json.dumps(make_plan(build_data), indent=2, sort_keys=True))
 
 
-def get_command(name):
-    try:
-        return commands[name]
-    except KeyError:
-        raise SystemExit("'%s' is not a valid command" % name)
+def cmd_build_many(paths, outfolder='.', concurrency=1):
+    """
+    Build all the build.yaml files in paths (files, or folders of them),
+    sharing buildpack and image preparation between them.
+    """
+    from vr.builder.batch import build_many
+    summary = build_many(paths, outfolder, concurrency=concurrency)
+    if summary['failed']:
+        raise SystemExit('%(failed)s of %(total)s builds failed' % dict(
+            summary, total=len(summary['builds'])))
 
 
-class BuildData(ConfigData):
-    _required = [
-        'app_name',
-        'app_repo_url',
-        'app_repo_type',
-        'version',
-    ]
+def _report_diff(diff):
+    import json
+    print(json.dumps(diff._asdict(), indent=2, sort_keys=True))
+    if any(diff):
+        raise SystemExit(1)
 
-    _optional = [
-        'buildpack_url',
-        'buildpack_urls',
-        'buildpack_version',
-        'image_url',
-        'image_name',
-        'image_md5',
-        'build_md5',
-        'release_data',
-    ]
 
-    def __init__(self, dct):
-        super(BuildData, self).__init__(dct)
+def cmd_manifest_diff(old, new):
+    """
+    Print, as JSON, the files added, removed and changed between two
+    build.manifest files.  Exit with status 1 if there are any.
+    """
+    from vr.builder.manifest import Manifest, diff
+    _report_diff(diff(Manifest.load(old), Manifest.load(new)))
 
-        # must provide buildpack_urls or buildpack_url
-        if self.buildpack_urls is None and self.buildpack_url is None:
-            raise ValueError('Must provide either buildpack_url or '
-                             'buildpack_urls')
 
-    def __repr__(self):
-        return '<BuildData: %s-%s>' % (self.app_name, self.version)
+def cmd_manifest_verify(manifest, folder, workers=None):
+    """
+    Print, as JSON, how the files in folder differ from a build.manifest.
+    Exit with status 1 if they differ at all.
+    """
+    from vr.builder.manifest import Manifest, verify
+    _report_diff(verify(Manifest.load(manifest), folder, workers))
 
 
-def main():
+# Commands that take a single build.yaml file, with their help text.
+commands = {
+    'build': (cmd_build, "Build an app."),
+    'shell': (cmd_shell, "Open a shell in an app's build container."),
+    'plan': (cmd_plan, "Report, as JSON, the work a build would do here."),
+}
+
 
-    cmd_list = ', '.join(sorted(commands.keys()))
+def __getattr__(name):
+    # BuildData used to be defined here; keep it importable from this
+    # module without loading vr.common on every invocation.
+    if name == 'BuildData':
+        from vr.builder.build_data import BuildData
+        return BuildData
+    raise AttributeError(
+        "module %r has no attribute %r" % (__name__, name))
 
+
+def positive_int(value):
+    "argparse type for counts of things to run at once."
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('%r is not a positive number' % value)
+    return number
+
+
+def _run_with_build_data(command):
+    def run(args):
+        from vr.builder.build_data import load_build_data
+        command(load_build_data(args.file))
+    return run
+
+
+def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('command', help='One of %s' % cmd_list,
-                        type=get_command)
-    parser.add_argument('file', help="Path to build.yaml file.")
-    args = parser.parse_args()
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    for name in sorted(commands):
+        command, description = commands[name]
+        sub = subparsers.add_parser(name, help=description)
+        sub.add_argument('file', help="Path to build.yaml file.")
+        sub.set_defaults(run=_run_with_build_data(command))
+
+    sub = subparsers.add_parser(
+        'build-many', help="Build many apps, sharing buildpacks and images.")
+    sub.add_argument('paths', nargs='+',
+                     help="Paths to build.yaml files, or folders of them.")
+    sub.add_argument('-j', '--concurrency', type=positive_int, default=1,
+                     help="Builds to run at once (default 1).")
+    sub.add_argument('-o', '--output', default='.',
+                     help="Folder for build outputs (default current).")
+    sub.set_defaults(run=lambda args: cmd_build_many(
+        args.paths, args.output, args.concurrency))
+
+    sub = subparsers.add_parser(
+        'manifest-diff', help="Compare two build.manifest files.")
+    sub.add_argument('old', help="Path to the older build.manifest.")
+    sub.add_argument('new', help="Path to the newer build.manifest.")
+    sub.set_defaults(run=lambda args: cmd_manifest_diff(args.old, args.new))
+
+    sub = subparsers.add_parser(
+        'manifest-verify', help="Check a folder against a build.manifest.")
+    sub.add_argument('manifest', help="Path to build.manifest.")
+    sub.add_argument('folder', help="Path to the extracted build.")
+    sub.add_argument('-w', '--workers', type=positive_int,
+                     help="Files to hash at once (default one per CPU).")
+    sub.set_defaults(run=lambda args: cmd_manifest_verify(
+        args.manifest, args.folder, workers=args.workers))
 
-    with open(args.file, 'rb') as f:
-        build = BuildData(yaml.safe_load(f))
-    args.command(build)
+    args = parser.parse_args()
+    args.run(args)
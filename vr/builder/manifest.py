@@ -0,0 +1,249 @@
+"""
+Manifests of the files in a built slug, so that two builds can be compared,
+or an extracted slug checked, without unpacking and rehashing the tarball.
+
+A manifest lists the path, size, mode and content digest of every regular
+file and symlink in the tree.  make_tarball writes one alongside
+build.tar.gz, computed as the files are fed to the tar writer, so the tree
+is only walked and read once.  diff(old, new) compares two manifests and
+verify(manifest, folder) checks a tree on disk against one.
+
+The file format is a gzipped sequence of fixed-layout records:
+
+    header: MAGIC, version (1 byte), algorithm name (length byte + ASCII),
+            entry count (4 bytes)
+    entry:  path length (2 bytes), size (8 bytes), mode (4 bytes),
+            path (UTF-8), raw digest
+
+with integers big-endian and entries sorted by path.
+"""
+
+import os
+import gzip
+import stat
+import struct
+import hashlib
+import binascii
+import collections
+
+from vr.builder.digest import file_digests
+
+
+MAGIC = b'VRMANIFEST'
+VERSION = 1
+DEFAULT_ALGORITHM = 'sha256'
+
+_header = struct.Struct('>BB')
+_count = struct.Struct('>I')
+_entry = struct.Struct('>HQI')
+
+
+Entry = collections.namedtuple('Entry', 'path size mode digest')
+Entry.__doc__ = """
+A file in a manifest.  mode includes the file type bits, and digest is the
+hex digest of the file's content (or, for a symlink, its target).
+"""
+
+Diff = collections.namedtuple('Diff', 'added removed changed')
+Diff.__doc__ = """
+Sorted lists of the paths added, removed and changed between two manifests.
+"""
+
+
+class Manifest(object):
+    """
+    The entries of a tree, keyed by path relative to its root, and the name
+    of the hashlib algorithm that produced their digests.
+    """
+    def __init__(self, entries=(), algorithm=DEFAULT_ALGORITHM):
+        self.algorithm = algorithm
+        self.entries = dict((entry.path, entry) for entry in entries)
+
+    def __iter__(self):
+        return (self.entries[path] for path in sorted(self.entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        self.entries[entry.path] = entry
+
+    def save(self, filename):
+        algorithm = self.algorithm.encode('ascii')
+        with gzip.open(filename, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_header.pack(VERSION, len(algorithm)))
+            f.write(algorithm)
+            f.write(_count.pack(len(self)))
+            for entry in self:
+                path = _encode_path(entry.path)
+                f.write(_entry.pack(len(path), entry.size, entry.mode))
+                f.write(path)
+                f.write(binascii.unhexlify(entry.digest))
+
+    @classmethod
+    def load(cls, filename):
+        with gzip.open(filename, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError('%s is not a manifest' % filename)
+        offset = len(MAGIC)
+
+        def read(size):
+            nonlocal offset
+            chunk = data[offset:offset + size]
+            if len(chunk) < size:
+                raise ValueError('%s is truncated' % filename)
+            offset += size
+            return chunk
+
+        version, alg_len = _header.unpack(read(_header.size))
+        if version != VERSION:
+            raise ValueError('Unsupported manifest version %s' % version)
+        algorithm = read(alg_len).decode('ascii')
+        count, = _count.unpack(read(_count.size))
+        digest_size = hashlib.new(algorithm).digest_size
+        manifest = cls(algorithm=algorithm)
+        for _ in range(count):
+            path_len, size, mode = _entry.unpack(read(_entry.size))
+            path = _decode_path(read(path_len))
+            digest = read(digest_size)
+            manifest.add(Entry(
+                path, size, mode, binascii.hexlify(digest).decode('ascii')))
+        if offset != len(data):
+            raise ValueError(
+                '%s has data after its last entry' % filename)
+        return manifest
+
+
+def _encode_path(path):
+    return path.encode('utf-8', 'surrogateescape')
+
+
+def _decode_path(data):
+    return data.decode('utf-8', 'surrogateescape')
+
+
+class _HashingReader(object):
+    """
+    Wrap a file so that everything read from it is also fed to digest.
+    """
+    def __init__(self, f, digest):
+        self._f = f
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def _walk(folder, arcname=''):
+    """
+    Yield (path, arcname) for folder and everything in it, in the order
+    TarFile.add would visit them.
+    """
+    yield folder, arcname
+    if os.path.isdir(folder) and not os.path.islink(folder):
+        for name in sorted(os.listdir(folder)):
+            for item in _walk(os.path.join(folder, name),
+                              os.path.join(arcname, name)):
+                yield item
+
+
+def add_tree(tar, folder, algorithm=DEFAULT_ALGORITHM):
+    """
+    Add the contents of folder to the open TarFile tar, as
+    tar.add(folder, arcname='') would, and return a Manifest of the files
+    added.  Each file's digest is taken as the tar writer reads it.
+    """
+    manifest = Manifest(algorithm=algorithm)
+    for path, arcname in _walk(folder):
+        tarinfo = tar.gettarinfo(path, arcname)
+        if tarinfo is None:
+            # sockets and the like can't be archived
+            continue
+        if tarinfo.isreg():
+            reader_digest = hashlib.new(algorithm)
+            with open(path, 'rb') as f:
+                tar.addfile(tarinfo, _HashingReader(f, reader_digest))
+            manifest.add(Entry(
+                tarinfo.name, tarinfo.size,
+                stat.S_IFREG | stat.S_IMODE(tarinfo.mode),
+                reader_digest.hexdigest()))
+            continue
+        tar.addfile(tarinfo)
+        if tarinfo.islnk():
+            # a hard link to a file that's already been added
+            target = manifest.entries[tarinfo.linkname]
+            manifest.add(target._replace(path=tarinfo.name))
+        elif tarinfo.issym():
+            manifest.add(_symlink_entry(
+                tarinfo.name, tarinfo.linkname, stat.S_IMODE(tarinfo.mode),
+                algorithm))
+    return manifest
+
+
+def _symlink_entry(path, target, mode, algorithm):
+    target = _encode_path(target)
+    digest = hashlib.new(algorithm, target).hexdigest()
+    return Entry(path, len(target), stat.S_IFLNK | mode, digest)
+
+
+def scan(folder, algorithm=DEFAULT_ALGORITHM, workers=None):
+    """
+    Return a Manifest of the tree at folder, hashing up to workers files at
+    a time.
+    """
+    files = {}
+    manifest = Manifest(algorithm=algorithm)
+    for root, dirs, names in os.walk(folder):
+        dirs.sort()
+        # symlinks to folders are listed in dirs, but not followed
+        for name in sorted(dirs + names):
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, folder).replace(os.sep, '/')
+            st = os.lstat(path)
+            if stat.S_ISLNK(st.st_mode):
+                manifest.add(_symlink_entry(
+                    relpath, os.readlink(path), stat.S_IMODE(st.st_mode),
+                    algorithm))
+            elif stat.S_ISREG(st.st_mode):
+                files[path] = relpath, st
+    digests = file_digests(files, algorithm, workers)
+    for path, (relpath, st) in files.items():
+        manifest.add(Entry(
+            relpath, st.st_size,
+            stat.S_IFREG | stat.S_IMODE(st.st_mode), digests[path]))
+    return manifest
+
+
+def diff(old, new):
+    """
+    Compare two manifests, returning a Diff of the paths in new but not
+    old, in old but not new, and in both but with a different size, mode or
+    content.
+    """
+    if old.algorithm != new.algorithm:
+        raise ValueError('Cannot compare %s manifest with %s manifest' % (
+            old.algorithm, new.algorithm))
+    old_paths = set(old.entries)
+    new_paths = set(new.entries)
+    changed = (
+        path
+        for path in old_paths & new_paths
+        if old.entries[path] != new.entries[path]
+    )
+    return Diff(
+        sorted(new_paths - old_paths),
+        sorted(old_paths - new_paths),
+        sorted(changed),
+    )
+
+
+def verify(manifest, folder, workers=None):
+    """
+    Check the tree at folder against manifest, returning a Diff of what's
+    on disk relative to the manifest.  Every list is empty if they match.
+    """
+    return diff(manifest, scan(folder, manifest.algorithm, workers))
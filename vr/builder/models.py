@@ -1,5 +1,4 @@
 import os
-import pwd
 import logging
 import shutil
 
@@ -14,21 +13,23 @@ from vr.common.utils import run, mkdir
 from vr.common.paths import VR_ROOT
 
 from vr.builder.slugignore import clean_slug_dir
-from .hashes import hash_text
+from .digest import hash_text
 from .py31compat import _defrag
 
 
-# If we're root, and RAPTOR_HOME hasn't been set, then put all checkouts in
-# /apps/builder
+def _get_home():
+    """
+    If we're root, and RAPTOR_HOME hasn't been set, then put all checkouts
+    in /apps/builder.
+    """
+    if 'RAPTOR_HOME' in os.environ:
+        return os.environ['RAPTOR_HOME']
+    if os.getuid() == 0:
+        return os.path.join(VR_ROOT, 'builder')
+    return os.path.expanduser('~/.raptor')
 
-me = pwd.getpwuid(os.getuid()).pw_name
 
-if 'RAPTOR_HOME' in os.environ:
-    HOME = os.environ['RAPTOR_HOME']
-elif pwd.getpwuid(os.getuid()).pw_name == 'root':
-    HOME = os.path.join(VR_ROOT, 'builder')
-else:
-    HOME = os.path.expanduser('~/.raptor')
+HOME = _get_home()
 PACKS_HOME = os.path.join(HOME, 'buildpacks')
 CACHE_HOME = os.path.join(HOME, 'cache')
 BUILD_HOME = os.path.join(HOME, 'build')
@@ -154,9 +155,7 @@ def update_buildpack(url, packs_dir=PACKS_HOME, vcs_type=None):
     nicely readable, followed by an MD5 hash of the full URL (thus
     distinguishing two buildpacks with the same 'name' but different URLs).
     """
-    defrag = _defrag(urllib.parse.urldefrag(url))
-    bpfolder = repo.basename(url) + '-' + hash_text(defrag.url)
-    dest = os.path.join(packs_dir, bpfolder)
+    dest = get_checkout_folder(url, packs_dir)
     # TODO: check for whether the buildpack in the folder is really the same as
     # the one we've been asked to add.
     mkdir(packs_dir)
@@ -166,15 +165,33 @@ def update_buildpack(url, packs_dir=PACKS_HOME, vcs_type=None):
 
 
 def update_app(name, url, version, repos_dir=REPO_HOME, vcs_type=None):
-    defrag = _defrag(urllib.parse.urldefrag(url))
-    appfolder = repo.basename(url) + '-' + hash_text(defrag.url)
-    dest = os.path.join(repos_dir, appfolder)
+    dest = get_checkout_folder(url, repos_dir)
     mkdir(repos_dir)
     app = App(dest, url, vcs_type=vcs_type)
     app.update(version)
     return app
 
 
+def get_checkout_folder(url, parent):
+    """
+    Given a repo URL and the folder holding checkouts (PACKS_HOME or
+    REPO_HOME), return the path where update_buildpack or update_app keeps
+    that repo checked out.
+    """
+    defrag = _defrag(urllib.parse.urldefrag(url))
+    name = repo.basename(url) + '-' + hash_text(defrag.url)
+    return os.path.join(parent, name)
+
+
+def get_cache_folder(app_name, app_url, cache_dir=CACHE_HOME):
+    """
+    Given an app name and repo URL, return the folder where the buildpack
+    cache for that app is kept between builds.
+    """
+    defrag = _defrag(urllib.parse.urldefrag(app_url))
+    return os.path.join(cache_dir, app_name + '-' + hash_text(defrag.url))
+
+
 def get_unique_repo_folder(repo_url):
     """
     Given a repository URL, return a folder name that's human-readable,
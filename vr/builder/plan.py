@@ -0,0 +1,176 @@
+"""
+Work out what a build would cost on this host, without building or fetching
+anything.  make_plan(build_data) is the main API.
+
+The plan inspects the checkouts in REPO_HOME and PACKS_HOME, the app's
+cache in CACHE_HOME and the unpacked OS image in IMAGES_ROOT, and reports
+for each step whether it is a cache hit along with estimated byte counts.
+Byte counts that can't be known without talking to the remote are reported
+as None.
+"""
+
+import os
+
+from six.moves import shlex_quote
+
+from vr.common.repo import guess_folder_vcs
+from vr.common.utils import run, chdir
+from vr.common.paths import IMAGES_ROOT
+from vr.builder.build_data import get_buildpack_urls
+from vr.builder.models import (get_checkout_folder, get_cache_folder,
+                               PACKS_HOME, REPO_HOME, CACHE_HOME)
+
+
+# Commands, and the argument template for them, that resolve a revision to
+# a node id using only local data.  Each is tried in turn; the first that
+# succeeds wins.
+_resolve_cmds = {
+    'git': [
+        # update_app resets branches to the origin, so prefer that ref.
+        ('git rev-parse --verify --quiet', 'origin/{rev}^{{commit}}'),
+        ('git rev-parse --verify --quiet', '{rev}^{{commit}}'),
+    ],
+    'hg': [
+        ("hg log --template '{node}' -r", '{rev}'),
+    ],
+}
+
+# Revisions the repo updates to when none is given.
+_default_revs = {
+    'git': 'master',
+    'hg': 'tip',
+}
+
+
+def resolve_revision(folder, rev=None, vcs_type=None):
+    """
+    Given a local checkout, return the node id that rev refers to, or None
+    if the checkout doesn't exist or doesn't know about rev.
+    """
+    vcs_type = vcs_type or guess_folder_vcs(folder)
+    if vcs_type not in _resolve_cmds:
+        return None
+    rev = rev or _default_revs[vcs_type]
+    with chdir(folder):
+        for cmd, arg in _resolve_cmds[vcs_type]:
+            result = run(cmd + ' ' + shlex_quote(arg.format(rev=rev)))
+            node = result.output.strip()
+            if result.status_code == 0 and node:
+                return node
+    return None
+
+
+def folder_size(folder):
+    """
+    Return the total size in bytes of the files under folder, not following
+    symlinks.  A missing folder has size 0.
+    """
+    total = 0
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def plan_checkout(url, parent, rev=None, vcs_type=None):
+    """
+    Plan the update and copy of one repo checked out under parent.
+
+    The checkout is a hit if it already holds the requested revision, in
+    which case nothing needs fetching.  Otherwise the fetch size is unknown.
+    Note that a branch may still have moved upstream.
+    """
+    folder = get_checkout_folder(url, parent)
+    url, _, fragment = url.partition('#')
+    rev = rev or fragment or None
+    exists = os.path.isdir(folder)
+    revision = exists and resolve_revision(folder, rev, vcs_type) or None
+    return {
+        'url': url,
+        'folder': folder,
+        'version': rev,
+        'revision': revision,
+        'hit': revision is not None,
+        'copy_bytes': folder_size(folder),
+        'fetch_bytes': 0 if revision else None,
+    }
+
+
+def plan_cache(app_name, app_url, cache_dir=CACHE_HOME):
+    """
+    Plan the copy of the app's buildpack cache into the build.
+    """
+    folder = get_cache_folder(app_name, app_url, cache_dir)
+    return {
+        'folder': folder,
+        'hit': os.path.isdir(folder),
+        'copy_bytes': folder_size(folder),
+    }
+
+
+def plan_image(image_name, image_url, images_root=IMAGES_ROOT):
+    """
+    Plan the download and unpacking of the OS image, which vrun setup skips
+    if the unpacked image is already in place.
+
+    Nothing is fetched if the image tarball is already downloaded, though
+    it may still need unpacking.
+    """
+    folder = os.path.join(images_root, image_name, 'contents')
+    tarball = os.path.join(
+        images_root, image_name, os.path.basename(image_url))
+    hit = os.path.isdir(folder)
+    return {
+        'name': image_name,
+        'url': image_url,
+        'folder': folder,
+        'hit': hit,
+        'fetch_bytes': 0 if hit or os.path.isfile(tarball) else None,
+    }
+
+
+def _sum(values):
+    "Sum values, or return None if any of them is unknown."
+    values = list(values)
+    return None if None in values else sum(values)
+
+
+def make_plan(build_data, repos_dir=REPO_HOME, packs_dir=PACKS_HOME,
+              cache_dir=CACHE_HOME, images_root=IMAGES_ROOT):
+    """
+    Given a BuildData, return a JSON-serializable dict describing the work a
+    build of it would do on this host.  image is None for builds without
+    an image_url.
+
+    archive_bytes is a lower bound: the checkout as it stands, before the
+    buildpack has added anything to it.
+    """
+    app = plan_checkout(
+        build_data.app_repo_url, repos_dir,
+        rev=build_data.version, vcs_type=build_data.app_repo_type)
+    buildpacks = [
+        plan_checkout(url, packs_dir)
+        for url in get_buildpack_urls(build_data)
+    ]
+    cache = plan_cache(build_data.app_name, build_data.app_repo_url, cache_dir)
+    image = None
+    if build_data.image_url:
+        image = plan_image(
+            build_data.image_name, build_data.image_url, images_root)
+    checkouts = [app] + buildpacks
+    fetches = checkouts + ([image] if image else [])
+    return {
+        'app_name': build_data.app_name,
+        'app': app,
+        'buildpacks': buildpacks,
+        'cache': cache,
+        'image': image,
+        'hit': all(step['hit'] for step in fetches + [cache]),
+        'copy_bytes': _sum(
+            step['copy_bytes'] for step in checkouts + [cache]),
+        'fetch_bytes': _sum(step['fetch_bytes'] for step in fetches),
+        'archive_bytes': app['copy_bytes'],
+    }
@@ -0,0 +1,8 @@
+import sys
+
+if sys.version_info >= (3, 9):
+    from importlib import resources
+else:
+    import importlib_resources as resources
+
+__all__ = ['resources']
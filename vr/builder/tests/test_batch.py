@@ -0,0 +1,155 @@
+import os
+import time
+import contextlib
+import multiprocessing
+
+import yaml
+import pytest
+
+from vr.builder import batch
+from vr.builder.build import pull_buildpacks
+from vr.builder.build_data import load_build_data
+from vr.builder.models import lock_or_wait
+
+
+def write_build(folder, name, **extra):
+    data = dict({
+        'app_name': name,
+        'app_repo_url': 'https://example.com/%s.git' % name,
+        'app_repo_type': 'git',
+        'version': '1.0',
+        'buildpack_url': 'https://example.com/pack.git',
+    }, **extra)
+    filename = os.path.join(str(folder), name + '.yaml')
+    with open(filename, 'w') as f:
+        yaml.safe_dump(data, f)
+    return filename
+
+
+def test_find_build_files(tmp_path):
+    b = write_build(tmp_path, 'b')
+    a = write_build(tmp_path, 'a')
+    (tmp_path / 'notes.txt').write_text(u'ignored')
+    other = tmp_path / 'other'
+    other.mkdir()
+    c = write_build(other, 'c')
+    (tmp_path / 'summary.yaml').write_text(u'builds: []')
+    assert list(batch.find_build_files([str(tmp_path), c])) == [a, b, c]
+
+
+class FakeBuildPack(object):
+    def __init__(self, folder):
+        self.folder = folder
+
+
+def test_prepare_buildpacks_once(tmp_path, monkeypatch):
+    updated = []
+
+    def update_buildpack(url):
+        updated.append(url)
+        folder = tmp_path / 'packs' / str(len(updated))
+        folder.mkdir(parents=True)
+        (folder / 'bin').write_text(u'compile')
+        return FakeBuildPack(str(folder))
+
+    monkeypatch.setattr(batch, 'update_buildpack', update_buildpack)
+    monkeypatch.setattr(
+        batch, 'lock_or_wait', lambda target: contextlib.suppress())
+    builds = [
+        load_build_data(write_build(tmp_path, 'a')),
+        load_build_data(write_build(tmp_path, 'b')),
+        load_build_data(write_build(
+            tmp_path, 'c', buildpack_url=None,
+            buildpack_urls=['https://example.com/pack.git',
+                            'https://example.com/other.git'])),
+        # some apps still pin older revisions of the same pack
+        load_build_data(write_build(
+            tmp_path, 'd', buildpack_url='https://example.com/pack.git#v1')),
+        load_build_data(write_build(
+            tmp_path, 'e', buildpack_url='https://example.com/pack.git#v2')),
+    ]
+    snapshots = batch.prepare_buildpacks(builds, str(tmp_path / 'snap'))
+    assert updated == [
+        'https://example.com/pack.git',
+        'https://example.com/other.git',
+        'https://example.com/pack.git#v1',
+        'https://example.com/pack.git#v2',
+    ]
+    assert sorted(snapshots) == sorted(updated)
+    assert len(set(snapshots.values())) == len(snapshots)
+
+    # builds copy from the snapshot rather than updating again
+    monkeypatch.chdir(tmp_path)
+    folders = pull_buildpacks(['https://example.com/pack.git'], snapshots)
+    assert os.listdir(folders[0]) == ['bin']
+    assert len(updated) == 4
+
+
+# build_many's pool must inherit the fake cmd_build below.
+needs_fork = pytest.mark.skipif(
+    multiprocessing.get_start_method() != 'fork',
+    reason="pool processes don't inherit monkeypatching")
+
+
+@pytest.fixture
+def fake_build(tmp_path, monkeypatch):
+    """
+    Replace cmd_build with one that holds the app's lock for a while, as
+    pull_app does, and fails for apps named 'broken'.
+    """
+    locks = str(tmp_path / 'locks')
+
+    def cmd_build(build_data, buildpacks=None):
+        print('building', build_data.app_name, build_data.version)
+        url, _, _ = build_data.app_repo_url.partition('#')
+        with lock_or_wait(url, folder=locks):
+            time.sleep(0.2)
+        if build_data.app_name == 'broken':
+            raise RuntimeError('compile failed')
+        build_data.build_md5 = 'md5-' + build_data.version
+
+    monkeypatch.setattr(batch, 'cmd_build', cmd_build)
+    monkeypatch.setattr(batch, 'prepare_buildpacks', lambda builds, f: {})
+    monkeypatch.setattr(batch, 'prepare_images', lambda builds: None)
+
+
+@needs_fork
+def test_build_many(tmp_path, fake_build):
+    builds = tmp_path / 'builds'
+    builds.mkdir()
+    write_build(builds, 'app')
+    write_build(builds, 'app2', app_name='app', version='2.0',
+                app_repo_url='https://example.com/app.git#2.0')
+    write_build(builds, 'broken')
+    (builds / 'junk.yaml').write_text(u'- not a build')
+    out = tmp_path / 'out'
+
+    summary = batch.build_many([str(builds)], str(out), concurrency=2)
+
+    with open(str(out / 'summary.yaml')) as f:
+        assert yaml.safe_load(f) == summary
+    assert summary['succeeded'] == 2
+    assert summary['failed'] == 2
+    results = dict(
+        (os.path.basename(r['file']), r) for r in summary['builds'])
+    # both versions of app ran, one after the other, without lock failures
+    assert results['app.yaml']['status'] == 'ok'
+    assert results['app.yaml']['build_md5'] == 'md5-1.0'
+    assert results['app2.yaml']['status'] == 'ok'
+    assert results['app2.yaml']['seconds'] >= 0.2
+    assert results['broken.yaml']['error'] == 'RuntimeError: compile failed'
+    assert results['junk.yaml']['status'] == 'failed'
+    log = (out / 'app-2.0' / 'build.log').read_text()
+    assert 'building app 2.0' in log
+    log = (out / 'broken-1.0' / 'build.log').read_text()
+    assert 'compile failed' in log
+
+
+@needs_fork
+def test_build_many_rerun_in_place(tmp_path, fake_build):
+    # summary.yaml written next to the build files isn't read back as one
+    write_build(tmp_path, 'app')
+    batch.build_many([str(tmp_path)], str(tmp_path))
+    summary = batch.build_many([str(tmp_path)], str(tmp_path))
+    assert summary['succeeded'] == 1
+    assert summary['failed'] == 0
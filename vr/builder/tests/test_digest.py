@@ -0,0 +1,49 @@
+import hashlib
+
+import pytest
+
+from vr.builder import digest
+from vr.builder.hashes import hash_text
+
+
+def test_hash_text_compatible():
+    # Folder names hashed by earlier releases must not change.
+    url = 'https://github.com/btubbs/vr_python_example.git'
+    assert hash_text(url) == hashlib.md5(url.encode('ascii')).hexdigest()
+    assert hash_text is digest.hash_text
+
+
+def test_hash_text_non_ascii():
+    url = u'https://example.com/caf\xe9.git'
+    expected = hashlib.md5(url.encode('utf-8')).hexdigest()
+    assert digest.hash_text(url) == expected
+
+
+def test_hash_text_memoized():
+    digest.hash_text.cache_clear()
+    digest.hash_text('https://example.com/app.git')
+    digest.hash_text('https://example.com/app.git')
+    assert digest.hash_text.cache_info().hits == 1
+
+
+@pytest.mark.parametrize('algorithm', ['md5', 'sha256', 'blake2b'])
+def test_file_digest(tmp_path, algorithm):
+    data = b'0123456789' * 1000
+    filename = tmp_path / 'data'
+    filename.write_bytes(data)
+    # a small chunk size makes sure chunks are joined correctly
+    result = digest.file_digest(str(filename), algorithm, chunk_size=333)
+    assert result == hashlib.new(algorithm, data).hexdigest()
+    text = digest.hash_text('text', algorithm)
+    assert text == hashlib.new(algorithm, b'text').hexdigest()
+
+
+def test_file_digests(tmp_path):
+    expected = {}
+    for n in range(10):
+        filename = tmp_path / str(n)
+        filename.write_bytes(str(n).encode('ascii') * (n + 1))
+        expected[str(filename)] = digest.file_digest(str(filename), 'sha256')
+    result = digest.file_digests(sorted(expected), 'sha256', workers=4)
+    assert result == expected
+    assert digest.file_digests([]) == {}
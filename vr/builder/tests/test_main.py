@@ -0,0 +1,72 @@
+import sys
+import argparse
+import subprocess
+
+import pytest
+
+from vr.builder import main
+
+
+# Modules that vr.builder.main must not load until a command needs them.
+HEAVY_MODULES = [
+    'pkg_resources',
+    'yaml',
+    'requests',
+    'tarfile',
+    'yg.lockfile',
+    'vr.common.models',
+    'vr.builder.build',
+    'vr.builder.models',
+]
+
+# Budget, in seconds, for importing vr.builder.main in a fresh interpreter.
+IMPORT_BUDGET = 0.1
+
+
+_bench_script = """
+import sys
+import time
+start = time.perf_counter()
+import vr.builder.main
+print(time.perf_counter() - start)
+print(','.join(sorted(sys.modules)))
+"""
+
+
+def measure_import():
+    """
+    Import vr.builder.main in a fresh interpreter and return the elapsed
+    seconds and the set of modules loaded as a result.
+    """
+    out = subprocess.check_output(
+        [sys.executable, '-c', _bench_script], universal_newlines=True)
+    elapsed, modules = out.splitlines()
+    return float(elapsed), set(modules.split(','))
+
+
+def test_import_defers_heavy_modules():
+    _, modules = measure_import()
+    assert not modules.intersection(HEAVY_MODULES)
+
+
+def test_import_time_budget():
+    # take the best of a few runs to dampen noise from a busy host
+    elapsed = min(measure_import()[0] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET
+
+
+def test_invalid_command(monkeypatch):
+    monkeypatch.setattr('sys.argv', ['vbuild', 'bogus', 'build.yaml'])
+    with pytest.raises(SystemExit):
+        main.main()
+
+
+@pytest.mark.parametrize('value', ['0', '-1', 'many'])
+def test_positive_int_rejects(value):
+    with pytest.raises((argparse.ArgumentTypeError, ValueError)):
+        main.positive_int(value)
+
+
+def test_build_data_compat():
+    from vr.builder.build_data import BuildData
+    assert main.BuildData is BuildData
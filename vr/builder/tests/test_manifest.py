@@ -0,0 +1,121 @@
+import os
+import gzip
+import tarfile
+
+import pytest
+
+from vr.builder import manifest
+from vr.builder import main
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'app'
+    (root / 'lib').mkdir(parents=True)
+    (root / 'lib' / 'mod.py').write_text(u'print("hi")\n')
+    (root / 'Procfile').write_text(u'web: run\n')
+    (root / 'big').write_bytes(os.urandom(100000))
+    os.chmod(str(root / 'Procfile'), 0o755)
+    os.symlink('lib/mod.py', str(root / 'link'))
+    os.symlink('lib', str(root / 'dirlink'))
+    os.link(str(root / 'big'), str(root / 'big2'))
+    return root
+
+
+def make_tarball(folder, filename):
+    with tarfile.open(filename, 'w:gz') as tar:
+        return manifest.add_tree(tar, str(folder))
+
+
+def test_add_tree_matches_tar_add(tree, tmp_path):
+    mf = make_tarball(tree, str(tmp_path / 'mine.tar.gz'))
+    with tarfile.open(str(tmp_path / 'theirs.tar.gz'), 'w:gz') as tar:
+        tar.add(str(tree), arcname='')
+    with tarfile.open(str(tmp_path / 'mine.tar.gz')) as tar:
+        mine = [(m.name, m.type, m.size, m.linkname) for m in tar]
+    with tarfile.open(str(tmp_path / 'theirs.tar.gz')) as tar:
+        theirs = [(m.name, m.type, m.size, m.linkname) for m in tar]
+    assert mine == theirs
+    assert sorted(mf.entries) == [
+        'Procfile', 'big', 'big2', 'dirlink', 'lib/mod.py', 'link']
+    assert mf.entries['big'].digest == mf.entries['big2'].digest
+
+
+def test_save_load(tree, tmp_path):
+    mf = manifest.scan(str(tree))
+    filename = str(tmp_path / 'build.manifest')
+    mf.save(filename)
+    loaded = manifest.Manifest.load(filename)
+    assert loaded.algorithm == mf.algorithm
+    assert list(loaded) == list(mf)
+
+
+def test_load_not_manifest(tmp_path):
+    filename = tmp_path / 'bogus'
+    with tarfile.open(str(filename), 'w:gz'):
+        pass
+    with pytest.raises(ValueError):
+        manifest.Manifest.load(str(filename))
+
+
+def test_load_truncated(tree, tmp_path):
+    filename = str(tmp_path / 'build.manifest')
+    manifest.scan(str(tree)).save(filename)
+    with gzip.open(filename, 'rb') as f:
+        data = f.read()
+    # cut inside the header, an entry's fields, a path and a digest
+    for end in (len(manifest.MAGIC) + 1, 30, 40, len(data) - 1):
+        with gzip.open(filename, 'wb') as f:
+            f.write(data[:end])
+        with pytest.raises(ValueError):
+            manifest.Manifest.load(filename)
+    with gzip.open(filename, 'wb') as f:
+        f.write(data + b'\0')
+    with pytest.raises(ValueError):
+        manifest.Manifest.load(filename)
+
+
+def test_verify(tree, tmp_path):
+    mf = make_tarball(tree, str(tmp_path / 'build.tar.gz'))
+    dest = tmp_path / 'extracted'
+    with tarfile.open(str(tmp_path / 'build.tar.gz')) as tar:
+        tar.extractall(str(dest))
+    assert not any(manifest.verify(mf, str(dest), workers=2))
+
+    (dest / 'lib' / 'mod.py').write_text(u'print("bye")\n')
+    (dest / 'Procfile').unlink()
+    (dest / 'extra').write_text(u'')
+    os.chmod(str(dest / 'big'), 0o600)
+    assert manifest.verify(mf, str(dest)) == manifest.Diff(
+        added=['extra'],
+        removed=['Procfile'],
+        changed=['big', 'big2', 'lib/mod.py'],
+    )
+
+
+def test_diff_cli(tree, tmp_path, monkeypatch, capsys):
+    old = str(tmp_path / 'old.manifest')
+    new = str(tmp_path / 'new.manifest')
+    manifest.scan(str(tree)).save(old)
+    monkeypatch.setattr('sys.argv', ['vbuild', 'manifest-diff', old, old])
+    main.main()
+
+    (tree / 'Procfile').write_text(u'web: other\n')
+    manifest.scan(str(tree)).save(new)
+    monkeypatch.setattr('sys.argv', ['vbuild', 'manifest-diff', old, new])
+    with pytest.raises(SystemExit):
+        main.main()
+    assert '"Procfile"' in capsys.readouterr().out
+
+
+def test_verify_cli(tree, tmp_path, monkeypatch, capsys):
+    filename = str(tmp_path / 'build.manifest')
+    manifest.scan(str(tree)).save(filename)
+    argv = ['vbuild', 'manifest-verify', filename, str(tree), '-w', '2']
+    monkeypatch.setattr('sys.argv', argv)
+    main.main()
+    assert '"changed": []' in capsys.readouterr().out
+
+    monkeypatch.setattr('sys.argv', argv[:-1] + ['0'])
+    with pytest.raises(SystemExit):
+        main.main()
@@ -0,0 +1,121 @@
+import os
+import json
+import pathlib
+import subprocess
+
+import pytest
+
+from vr.builder.build_data import BuildData
+from vr.builder.models import get_checkout_folder, get_cache_folder
+from vr.builder.plan import make_plan, resolve_revision, folder_size
+from vr.builder import main
+
+
+APP_URL = 'https://example.com/someapp.git'
+BP_URL = 'https://example.com/somepack.git'
+
+
+def git(folder, *args):
+    cmd = ('git', '-C', str(folder), '-c', 'user.name=test',
+           '-c', 'user.email=test@example.com') + args
+    return subprocess.check_output(cmd, universal_newlines=True).strip()
+
+
+def make_repo(folder):
+    folder = pathlib.Path(folder)
+    os.makedirs(str(folder))
+    git(folder, 'init', '-q')
+    git(folder, 'checkout', '-q', '-b', 'master')
+    folder.joinpath('README').write_text(u'hello\n')
+    git(folder, 'add', 'README')
+    git(folder, 'commit', '-q', '-m', 'initial')
+    return git(folder, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def homes(tmp_path):
+    return {
+        'repos_dir': str(tmp_path / 'repo'),
+        'packs_dir': str(tmp_path / 'buildpacks'),
+        'cache_dir': str(tmp_path / 'cache'),
+        'images_root': str(tmp_path / 'images'),
+    }
+
+
+@pytest.fixture
+def build_data():
+    return BuildData({
+        'app_name': 'someapp',
+        'app_repo_url': APP_URL,
+        'app_repo_type': 'git',
+        'version': 'master',
+        'buildpack_url': BP_URL,
+    })
+
+
+def test_cold_host(homes, build_data):
+    plan = make_plan(build_data, **homes)
+    assert not plan['hit']
+    assert not plan['app']['hit']
+    assert plan['app']['revision'] is None
+    assert plan['fetch_bytes'] is None
+    assert plan['copy_bytes'] == 0
+    json.dumps(plan)
+
+
+def test_warm_host(homes, build_data):
+    app_folder = get_checkout_folder(APP_URL, homes['repos_dir'])
+    app_rev = make_repo(app_folder)
+    bp_folder = get_checkout_folder(BP_URL, homes['packs_dir'])
+    make_repo(bp_folder)
+    cache_folder = get_cache_folder('someapp', APP_URL, homes['cache_dir'])
+    os.makedirs(cache_folder)
+    with open(os.path.join(cache_folder, 'dep'), 'wb') as f:
+        f.write(b'x' * 100)
+
+    plan = make_plan(build_data, **homes)
+    assert plan['hit']
+    assert plan['app']['revision'] == app_rev
+    assert plan['cache']['copy_bytes'] == 100
+    assert plan['fetch_bytes'] == 0
+    assert plan['copy_bytes'] == (
+        folder_size(app_folder) + folder_size(bp_folder) + 100)
+    assert plan['archive_bytes'] == folder_size(app_folder)
+    assert plan['image'] is None
+
+
+def test_image(homes, build_data):
+    build_data.image_name = 'base'
+    build_data.image_url = 'https://example.com/images/base.tar.gz'
+    plan = make_plan(build_data, **homes)
+    assert not plan['image']['hit']
+    assert plan['image']['fetch_bytes'] is None
+
+    images = os.path.join(homes['images_root'], 'base')
+    os.makedirs(images)
+    open(os.path.join(images, 'base.tar.gz'), 'wb').close()
+    plan = make_plan(build_data, **homes)
+    assert not plan['image']['hit']
+    assert plan['image']['fetch_bytes'] == 0
+
+    os.makedirs(os.path.join(images, 'contents'))
+    plan = make_plan(build_data, **homes)
+    assert plan['image']['hit']
+
+
+def test_unknown_revision(tmp_path):
+    folder = tmp_path / 'repo'
+    make_repo(folder)
+    assert resolve_revision(str(folder), 'no-such-branch', 'git') is None
+
+
+def test_plan_cli(capsys, monkeypatch, tmp_path, build_data, homes):
+    import vr.builder.plan
+    monkeypatch.setattr(vr.builder.plan, 'make_plan',
+                        lambda bd: make_plan(bd, **homes))
+    filename = tmp_path / 'build.yaml'
+    filename.write_text(build_data.as_yaml())
+    monkeypatch.setattr('sys.argv', ['vbuild', 'plan', str(filename)])
+    main.main()
+    plan = json.loads(capsys.readouterr().out)
+    assert plan['app_name'] == 'someapp'